@@ -1,8 +1,10 @@
 import os
+import threading
 from typing import Dict, Optional
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
+from file_utils import atomic_write, locked_file
 
 
 class AccountManager:
@@ -10,10 +12,11 @@ class AccountManager:
         self.client_secret_file = client_secret_file
         self.accounts: Dict[str, Credentials] = {}
         self.token_dir = "token_files"
+        self.lock = threading.Lock()
+        self.account_locks: Dict[str, threading.RLock] = {}
 
         # Ensure token directory exists
-        if not os.path.exists(self.token_dir):
-            os.makedirs(self.token_dir)
+        os.makedirs(self.token_dir, exist_ok=True)
 
     def add_account(self, account_id: str) -> bool:
         """Add a new account by performing OAuth flow"""
@@ -29,39 +32,74 @@ class AccountManager:
             creds = flow.run_local_server(port=0, timeout=30)
 
             # Save credentials
-            self.accounts[account_id] = creds
-            self._save_credentials(account_id, creds)
+            with self._account_lock(account_id):
+                with locked_file(self._token_file(account_id)):
+                    self._save_credentials(account_id, creds)
+                with self.lock:
+                    self.accounts[account_id] = creds
             return True
         except Exception as e:
             print(f"Error adding account: {e}")
             return False
 
-    def get_account(self, account_id: str) -> Optional[Credentials]:
+    def get_account(
+        self, account_id: str, quiet: bool = False
+    ) -> Optional[Credentials]:
         """Get credentials for an account"""
-        if account_id in self.accounts:
-            return self.accounts[account_id]
+        with self._account_lock(account_id):
+            with self.lock:
+                creds = self.accounts.get(account_id)
+            if creds and creds.valid:
+                return creds
+
+            # Load from file, where another session may have refreshed already
+            with locked_file(self._token_file(account_id)):
+                creds = self._load_credentials(account_id, quiet=quiet)
+            if creds:
+                with self.lock:
+                    self.accounts[account_id] = creds
+                return creds
 
-        # Try to load from file
-        creds = self._load_credentials(account_id)
-        if creds:
-            self.accounts[account_id] = creds
-            return creds
+            return None
+
+    def load_saved_accounts(self, quiet: bool = False) -> list:
+        """Load every account that has a saved token file"""
+        for file_name in os.listdir(self.token_dir):
+            if not (file_name.startswith("token_") and file_name.endswith(".json")):
+                continue
 
-        return None
+            account_id = file_name[len("token_") : -len(".json")]
+            # Skip the token files create_service keeps for itself
+            if account_id.startswith("calendar_v3"):
+                continue
+            self.get_account(account_id, quiet=quiet)
+
+        return self.list_accounts()
 
     def list_accounts(self) -> list:
         """List all available accounts"""
-        return list(self.accounts.keys())
+        with self.lock:
+            return list(self.accounts.keys())
+
+    def _account_lock(self, account_id: str) -> threading.RLock:
+        """Get the lock serializing loads and refreshes of one account"""
+        with self.lock:
+            if account_id not in self.account_locks:
+                self.account_locks[account_id] = threading.RLock()
+            return self.account_locks[account_id]
+
+    def _token_file(self, account_id: str) -> str:
+        return os.path.join(self.token_dir, f"token_{account_id}.json")
 
     def _save_credentials(self, account_id: str, creds: Credentials):
         """Save credentials to file"""
-        token_file = os.path.join(self.token_dir, f"token_{account_id}.json")
-        with open(token_file, "w") as token:
-            token.write(creds.to_json())
+        atomic_write(self._token_file(account_id), creds.to_json())
 
-    def _load_credentials(self, account_id: str) -> Optional[Credentials]:
+    def _load_credentials(
+        self, account_id: str, quiet: bool = False
+    ) -> Optional[Credentials]:
         """Load credentials from file"""
-        token_file = os.path.join(self.token_dir, f"token_{account_id}.json")
+        token_file = self._token_file(account_id)
         if not os.path.exists(token_file):
             return None
 
@@ -79,7 +117,8 @@ class AccountManager:
 
             return creds
         except Exception as e:
-            print(f"Error loading credentials: {e}")
+            if not quiet:
+                print(f"Error loading credentials: {e}")
             return None
 
 
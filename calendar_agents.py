@@ -1,12 +1,22 @@
 from agents import Agent, Runner, function_tool
-from prompts import calendar_agent_system_prompt, main_agent_system_prompt
+from account_manager import account_manager
+from prompts import (
+    build_calendar_agent_context,
+    calendar_agent_system_prompt,
+    main_agent_system_prompt,
+)
 from calendar_tools import (
     list_calendar_list,
     list_calendar_events,
+    list_calendar_events_in_window,
     insert_calendar_event,
     create_calendar_list,
     add_calendar_account,
     list_calendar_accounts,
+    get_time_spent_stats,
+    get_busiest_days_stats,
+    get_calendar_api_metrics,
+    get_working_calendars,
 )
 
 MODEL = "gpt-4o-mini"
@@ -22,9 +32,16 @@ def transfer_to_calendar_agent():
     return calendar_agent
 
 
+def calendar_agent_instructions(context, agent) -> str:
+    """Static, cacheable prompt prefix followed by the per-run session context"""
+    return calendar_agent_system_prompt + build_calendar_agent_context(
+        account_manager.load_saved_accounts(quiet=True), get_working_calendars()
+    )
+
+
 calendar_agent = Agent(
     name="calendar_agent",
-    instructions=calendar_agent_system_prompt,
+    instructions=calendar_agent_instructions,
 )
 
 main_agent = Agent(
@@ -45,8 +62,12 @@ calendar_agent.tools.extend(
         add_calendar_account,
         list_calendar_accounts,
         list_calendar_events,
+        list_calendar_events_in_window,
         list_calendar_list,
         insert_calendar_event,
         create_calendar_list,
+        get_time_spent_stats,
+        get_busiest_days_stats,
+        get_calendar_api_metrics,
     ]
 )
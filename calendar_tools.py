@@ -1,16 +1,49 @@
+import datetime
 import json
+import threading
+from itertools import islice
 from agents import function_tool
+from googleapiclient.errors import HttpError
 from googleapis import create_service
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
 from account_manager import account_manager
+from idempotency import event_content_id
+from pagination import iter_paginated
+from rate_limiter import rate_limiter
+from prompts import WORKING_CALENDAR_NAME
+from recurrence import iter_event_instances, parse_window_time, recurrence_cache
+from snapshot import (
+    CalendarSnapshot,
+    busiest_days_stats,
+    snapshot_store,
+    time_spent_stats,
+)
 
+# Working calendar id per account, resolved while listing or creating calendars
+working_calendars: Dict[str, str] = {}
+working_calendars_lock = threading.Lock()
 
-def construct_google_calendar_client(account_id: str):
+
+def set_working_calendar(account_id: str, calendar_id: str):
+    """Record the working calendar id of an account"""
+    with working_calendars_lock:
+        working_calendars[account_id] = calendar_id
+
+
+def get_working_calendars() -> Dict[str, str]:
+    """Get a snapshot of the working calendar ids resolved so far"""
+    with working_calendars_lock:
+        return dict(working_calendars)
+
+
+def construct_google_calendar_client(account_id: str, quiet: bool = False):
     """
     Constructs a Google Calendar API client for a specific account.
 
     Parameters:
     - account_id (str): The ID of the account to use.
+    - quiet (bool): Whether to keep status and error messages off the terminal,
+      e.g. when running in the background.
 
     Returns:
     - service: The Google Calendar API service instance.
@@ -23,7 +56,7 @@ def construct_google_calendar_client(account_id: str):
     ]
 
     # Get credentials for the account
-    creds = account_manager.get_account(account_id)
+    creds = account_manager.get_account(account_id, quiet=quiet)
     if not creds:
         raise ValueError(f"No credentials found for account {account_id}")
 
@@ -33,7 +66,11 @@ def construct_google_calendar_client(account_id: str):
         API_VERSION,
         SCOPES,
         prefix=f"_{account_id}",  # Use account-specific token file
+        credentials=creds,
+        quiet=quiet,
     )
+    if not service:
+        raise ValueError(f"Failed to create calendar service for account {account_id}")
     return service
 
 
@@ -63,7 +100,24 @@ def list_calendar_accounts() -> List[str]:
     Returns:
     - list: A list of account IDs.
     """
-    return account_manager.list_accounts()
+    # Load saved accounts here rather than relying on the prefetch having
+    # finished, so the answer doesn't depend on how fast the user typed
+    return account_manager.load_saved_accounts()
+
+
+@function_tool
+def get_calendar_api_metrics(account_id: str) -> Dict[str, Any]:
+    """
+    Reports Google Calendar API usage for a specific account in this session.
+
+    Parameters:
+    - account_id (str): The ID of the account to report on.
+
+    Returns:
+    - dict: Request, success, retry and failure counts, seconds spent waiting
+      on the rate limiter and in backoff, and the current request rate.
+    """
+    return rate_limiter.get_metrics(account_id)
 
 
 @function_tool
@@ -80,12 +134,92 @@ def create_calendar_list(account_id: str, calendar_name: str) -> Dict[str, Any]:
     """
     calendar_service = construct_google_calendar_client(account_id)
     calendar_list = {"summary": calendar_name}
-    created_calendar_list = (
-        calendar_service.calendars().insert(body=calendar_list).execute()
+    created_calendar_list = rate_limiter.execute(
+        account_id, calendar_service.calendars().insert(body=calendar_list)
     )
+    if calendar_name == WORKING_CALENDAR_NAME:
+        set_working_calendar(account_id, created_calendar_list["id"])
     return created_calendar_list
 
 
+def iter_calendar_list(
+    account_id: str,
+    page_size: int = 200,
+    max_items: Optional[int] = None,
+    prefetch: bool = True,
+    calendar_service=None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the calendars of a specific account, page by page.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - page_size (int): The number of calendars requested per page.
+    - max_items (int): Optional number of calendars needed at most.
+    - prefetch (bool): Whether to fetch the next page in the background.
+    - calendar_service: Optional service to reuse instead of constructing one.
+
+    Yields:
+    - dict: Calendar list entries as returned by the API.
+    """
+    if calendar_service is None:
+        calendar_service = construct_google_calendar_client(account_id)
+    return iter_paginated(
+        account_id,
+        lambda page_token: calendar_service.calendarList().list(
+            maxResults=page_size, pageToken=page_token
+        ),
+        max_items=max_items,
+        prefetch=prefetch,
+    )
+
+
+def iter_calendar_events(
+    account_id: str,
+    calendar_id: str,
+    page_size: int = 250,
+    single_events: bool = True,
+    time_min: Optional[datetime.datetime] = None,
+    time_max: Optional[datetime.datetime] = None,
+    max_items: Optional[int] = None,
+    calendar_service=None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the events of a calendar, page by page.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar from which to list events.
+    - page_size (int): The number of events requested per page.
+    - single_events (bool): Whether to expand recurring events server-side,
+      ordered by start time.
+    - time_min (datetime): Optional aware lower bound for the events' end.
+    - time_max (datetime): Optional aware upper bound for the events' start.
+    - max_items (int): Optional number of events needed at most.
+    - calendar_service: Optional service to reuse instead of constructing one.
+
+    Yields:
+    - dict: Events as returned by the API.
+    """
+    if calendar_service is None:
+        calendar_service = construct_google_calendar_client(account_id)
+    params = {"calendarId": calendar_id, "singleEvents": single_events}
+    if single_events:
+        params["orderBy"] = "startTime"
+    if time_min:
+        params["timeMin"] = time_min.isoformat()
+    if time_max:
+        params["timeMax"] = time_max.isoformat()
+
+    return iter_paginated(
+        account_id,
+        lambda page_token: calendar_service.events().list(
+            maxResults=page_size, pageToken=page_token, **params
+        ),
+        max_items=max_items,
+    )
+
+
 @function_tool
 def list_calendar_list(account_id: str, max_capacity: int) -> List[Dict[str, str]]:
     """
@@ -101,33 +235,13 @@ def list_calendar_list(account_id: str, max_capacity: int) -> List[Dict[str, str
     if isinstance(max_capacity, str):
         max_capacity = int(max_capacity)
 
-    calendar_service = construct_google_calendar_client(account_id)
-    all_calendars = []
+    calendars = iter_calendar_list(
+        account_id, page_size=min(200, max_capacity), max_items=max_capacity
+    )
     all_calendars_cleaned = []
-    next_page_token = None
-    capacity_tracker = 0
-
-    while True:
-        calendar_list = (
-            calendar_service.calendarList()
-            .list(
-                maxResults=min(200, max_capacity - capacity_tracker),
-                pageToken=next_page_token,
-            )
-            .execute()
-        )
-
-        calendars = calendar_list.get("items", [])
-        all_calendars.extend(calendars)
-        capacity_tracker += len(calendars)
-        if capacity_tracker >= max_capacity:
-            break
-
-        next_page_token = calendar_list.get("nextPageToken")
-        if not next_page_token:
-            break
-
-    for calendar in all_calendars:
+    for calendar in calendars:
+        if calendar["summary"] == WORKING_CALENDAR_NAME:
+            set_working_calendar(account_id, calendar["id"])
         all_calendars_cleaned.append(
             {
                 "id": calendar["id"],
@@ -156,32 +270,219 @@ def list_calendar_events(
     if isinstance(max_capacity, str):
         max_capacity = int(max_capacity)
 
-    calendar_service = construct_google_calendar_client(account_id)
-    all_events = []
-    next_page_token = None
-    capacity_tracker = 0
-    while True:
-        events_list = (
-            calendar_service.events()
-            .list(
-                calendarId=calendar_id,
-                maxResults=min(250, max_capacity - capacity_tracker),
-                pageToken=next_page_token,
-                orderBy="startTime",
-                singleEvents=True,
+    events = iter_calendar_events(
+        account_id,
+        calendar_id,
+        page_size=min(250, max_capacity),
+        max_items=max_capacity,
+    )
+    return list(events)
+
+
+def fetch_master_events(
+    account_id: str,
+    calendar_id: str,
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+    calendar_service=None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches a calendar's events in a window without expanding recurring events.
+
+    The API returns the single events in the window plus the recurring masters
+    overlapping it once, with their RRULEs, so the result is cached and
+    expanded client-side for any window inside the fetched one.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar to fetch.
+    - window_start (datetime): Aware start of the window.
+    - window_end (datetime): Aware end of the window.
+    - calendar_service: Optional service to reuse instead of constructing one.
+
+    Returns:
+    - list: Single events, recurring masters and their modified instances.
+    """
+    cached = recurrence_cache.get(account_id, calendar_id, window_start, window_end)
+    if cached is not None:
+        return cached
+
+    # Wait for an in-flight fetch of the same calendar, e.g. a prefetch
+    with recurrence_cache.fetch_lock(account_id, calendar_id):
+        cached = recurrence_cache.get(account_id, calendar_id, window_start, window_end)
+        if cached is not None:
+            return cached
+
+        all_events = list(
+            iter_calendar_events(
+                account_id,
+                calendar_id,
+                page_size=2500,
+                single_events=False,
+                time_min=window_start,
+                time_max=window_end,
+                calendar_service=calendar_service,
             )
-            .execute()
         )
-        events = events_list.get("items", [])
-        all_events.extend(events)
-        capacity_tracker += len(events)
-        if capacity_tracker >= max_capacity:
-            break
-        next_page_token = events_list.get("nextPageToken")
-        if not next_page_token:
-            break
+        recurrence_cache.set(
+            account_id, calendar_id, window_start, window_end, all_events
+        )
+        return all_events
 
-    return all_events
+
+def resolve_working_calendar(account_id: str, calendar_service=None) -> Optional[str]:
+    """
+    Finds the id of an account's working calendar, stopping at the first match.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_service: Optional service to reuse instead of constructing one.
+
+    Returns:
+    - str: The calendar id, or None if the account has no working calendar yet.
+    """
+    calendar_id = get_working_calendars().get(account_id)
+    if calendar_id:
+        return calendar_id
+
+    # No prefetch, the match usually comes before the last page
+    for calendar in iter_calendar_list(
+        account_id, prefetch=False, calendar_service=calendar_service
+    ):
+        if calendar["summary"] == WORKING_CALENDAR_NAME:
+            set_working_calendar(account_id, calendar["id"])
+            return calendar["id"]
+    return None
+
+
+@function_tool
+def list_calendar_events_in_window(
+    account_id: str,
+    calendar_id: str,
+    time_min: str,
+    time_max: str,
+    max_capacity: int,
+) -> List[Dict[str, Any]]:
+    """
+    Lists event instances overlapping a time window, expanding recurring events.
+
+    Prefer this over list_calendar_events when checking for conflicts or free
+    slots, since recurring events are expanded exactly within the window.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar from which to list events.
+    - time_min (str): Start of the window in ISO format.
+    - time_max (str): End of the window in ISO format.
+    - max_capacity (int or str): The maximum number of events to retrieve.
+
+    Returns:
+    - list: Event instances in the window, ordered by start time.
+    """
+    if isinstance(max_capacity, str):
+        max_capacity = int(max_capacity)
+
+    window_start = parse_window_time(time_min)
+    window_end = parse_window_time(time_max)
+    events = fetch_master_events(account_id, calendar_id, window_start, window_end)
+    instances = iter_event_instances(events, window_start, window_end)
+    return list(islice(instances, max_capacity))
+
+
+def load_calendar_snapshot(
+    account_id: str,
+    calendar_id: str,
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+) -> CalendarSnapshot:
+    """
+    Gets the columnar snapshot of a calendar covering a time window.
+
+    The snapshot is memory-mapped from disk when a fresh one covers the
+    window, otherwise it is rebuilt from the master events, spanning at
+    least the past year and the next quarter so later questions reuse it.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar to summarize.
+    - window_start (datetime): Aware start of the window.
+    - window_end (datetime): Aware end of the window.
+
+    Returns:
+    - CalendarSnapshot: The snapshot of the calendar.
+    """
+    snapshot = snapshot_store.load(account_id, calendar_id)
+    if snapshot and snapshot.covers(window_start.timestamp(), window_end.timestamp()):
+        return snapshot
+
+    now = datetime.datetime.now().astimezone()
+    build_start = min(window_start, now - datetime.timedelta(days=365))
+    build_end = max(window_end, now + datetime.timedelta(days=90))
+    events = fetch_master_events(account_id, calendar_id, build_start, build_end)
+    return snapshot_store.save(
+        account_id,
+        calendar_id,
+        iter_event_instances(events, build_start, build_end),
+        build_start,
+        build_end,
+    )
+
+
+@function_tool
+def get_time_spent_stats(
+    account_id: str, calendar_id: str, time_min: str, time_max: str
+) -> Dict[str, Any]:
+    """
+    Summarizes the time spent in events over a period, e.g. hours of meetings
+    last quarter, without listing the events themselves.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar to summarize.
+    - time_min (str): Start of the period in ISO format.
+    - time_max (str): End of the period in ISO format.
+
+    Returns:
+    - dict: Event count, total hours, average minutes per event, events with
+      attendees and the events taking the most time.
+    """
+    window_start = parse_window_time(time_min)
+    window_end = parse_window_time(time_max)
+    snapshot = load_calendar_snapshot(account_id, calendar_id, window_start, window_end)
+    return time_spent_stats(snapshot, window_start.timestamp(), window_end.timestamp())
+
+
+@function_tool
+def get_busiest_days_stats(
+    account_id: str, calendar_id: str, time_min: str, time_max: str, top_n: int
+) -> Dict[str, Any]:
+    """
+    Finds the busiest days and weekdays over a period.
+
+    Parameters:
+    - account_id (str): The ID of the account to use.
+    - calendar_id (str): The ID of the calendar to summarize.
+    - time_min (str): Start of the period in ISO format.
+    - time_max (str): End of the period in ISO format.
+    - top_n (int or str): The number of busiest days to return.
+
+    Returns:
+    - dict: The busiest days with their hours and event counts, and the hours
+      spent per weekday.
+    """
+    if isinstance(top_n, str):
+        top_n = int(top_n)
+
+    window_start = parse_window_time(time_min)
+    window_end = parse_window_time(time_max)
+    snapshot = load_calendar_snapshot(account_id, calendar_id, window_start, window_end)
+    return busiest_days_stats(
+        snapshot,
+        window_start.timestamp(),
+        window_end.timestamp(),
+        window_start.utcoffset().total_seconds(),
+        top_n,
+    )
 
 
 @function_tool
@@ -218,7 +519,6 @@ def insert_calendar_event(
     if attendees is None:
         attendees = []
 
-    calendar_service = construct_google_calendar_client(account_id)
     request_body = {
         "summary": summary,
         "location": location,
@@ -237,15 +537,46 @@ def insert_calendar_event(
     if create_google_meet:
         request_body["conferenceData"] = {
             "createRequest": {
-                "requestId": f"meet_{start_time.replace(':', '').replace('-', '')}",
                 "conferenceSolutionKey": {"type": "hangoutsMeet"},
             }
         }
 
-    event = (
-        calendar_service.events()
-        .insert(calendarId=calendar_id, body=request_body, conferenceDataVersion=1)
-        .execute()
-    )
+    # A content-derived id makes repeated inserts of the same event no-ops
+    event_id = event_content_id(calendar_id, request_body)
+    request_body["id"] = event_id
+    if create_google_meet:
+        request_body["conferenceData"]["createRequest"]["requestId"] = event_id
+
+    calendar_service = construct_google_calendar_client(account_id)
+    try:
+        event = rate_limiter.execute(
+            account_id,
+            calendar_service.events().insert(
+                calendarId=calendar_id, body=request_body, conferenceDataVersion=1
+            ),
+        )
+    except HttpError as error:
+        if error.resp.status != 409:
+            raise
+
+        # The event already exists, e.g. a retry after the insert went through
+        event = rate_limiter.execute(
+            account_id,
+            calendar_service.events().get(calendarId=calendar_id, eventId=event_id),
+        )
+        if event.get("status") == "cancelled":
+            # Deleted events keep their id, so recreating one restores it
+            event = rate_limiter.execute(
+                account_id,
+                calendar_service.events().update(
+                    calendarId=calendar_id,
+                    eventId=event_id,
+                    body={**request_body, "status": "confirmed"},
+                    conferenceDataVersion=1,
+                ),
+            )
+
+    recurrence_cache.invalidate(account_id, calendar_id)
+    snapshot_store.invalidate(account_id, calendar_id)
 
     return event
@@ -7,6 +7,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import Resource, build
 from googleapiclient.errors import HttpError
+from file_utils import atomic_write, locked_file
 
 
 def create_service(
@@ -15,57 +16,65 @@ def create_service(
     api_version: str,
     *scopes: List[str],
     prefix: str = "",
+    credentials: Optional[Credentials] = None,
+    quiet: bool = False,
 ) -> Optional[Resource]:
     CLIENT_SECRET_FILE = client_secret_file
     API_SERVICE_NAME = api_name
     API_VERSION = api_version
     SCOPES = [scope for scope in scopes[0]]
 
-    creds = None
+    creds = credentials
     working_dir = os.getcwd()
     token_dir = "token_files"
     token_file = f"token_{API_SERVICE_NAME}_{API_VERSION}{prefix}.json"
 
     ### Check if token dir exists first, if not, create the folder
-    if not os.path.exists(os.path.join(working_dir, token_dir)):
-        os.mkdir(os.path.join(working_dir, token_dir))
+    os.makedirs(os.path.join(working_dir, token_dir), exist_ok=True)
+    token_path = os.path.join(working_dir, token_dir, token_file)
 
-    if os.path.exists(os.path.join(working_dir, token_dir, token_file)):
-        creds = Credentials.from_authorized_user_file(
-            os.path.join(working_dir, token_dir, token_file), SCOPES
-        )
+    if not creds:
+        # Serialize with other threads and processes sharing the token file
+        with locked_file(token_path):
+            if os.path.exists(token_path):
+                creds = Credentials.from_authorized_user_file(token_path, SCOPES)
 
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
-            try:
-                creds = flow.run_local_server(
-                    port=0, timeout=30
-                )  # Adding 30 second timeout
-            except Exception as e:
-                print(f"Error during authentication: {e}")
-                return None
+            # If there are no (valid) credentials available, let the user log in.
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        CLIENT_SECRET_FILE, SCOPES
+                    )
+                    try:
+                        creds = flow.run_local_server(
+                            port=0, timeout=30
+                        )  # Adding 30 second timeout
+                    except Exception as e:
+                        if not quiet:
+                            print(f"Error during authentication: {e}")
+                        return None
 
-            # Save the credentials for the next run
-            with open(os.path.join(working_dir, token_dir, token_file), "w") as token:
-                token.write(creds.to_json())
+                # Save the credentials for the next run
+                atomic_write(token_path, creds.to_json())
 
     try:
         service = build(
             API_SERVICE_NAME, API_VERSION, credentials=creds, static_discovery=False
         )
-        print(API_SERVICE_NAME, API_VERSION, "service created successfully")
+        if not quiet:
+            print(API_SERVICE_NAME, API_VERSION, "service created successfully")
 
         return service
 
     except Exception as error:
-        print(error)
-        print(
-            f"Failed to create service instance for {API_SERVICE_NAME}, error: {error}"
-        )
-        if os.path.exists(os.path.join(working_dir, token_dir, token_file)):
-            os.remove(os.path.join(working_dir, token_dir, token_file))
+        if not quiet:
+            print(error)
+            print(
+                f"Failed to create service instance for {API_SERVICE_NAME}, "
+                f"error: {error}"
+            )
+        if not credentials and os.path.exists(token_path):
+            os.remove(token_path)
         return None
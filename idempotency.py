@@ -0,0 +1,46 @@
+import hashlib
+import json
+from typing import Any, Dict
+
+from dateutil import tz
+from dateutil.parser import isoparse
+
+
+def _normalize_time(value: Dict[str, str]) -> Dict[str, str]:
+    """Write an event time as UTC so the same instant always hashes the same"""
+    value = dict(value)
+    if "dateTime" in value:
+        parsed = isoparse(value["dateTime"])
+        # Naive times are interpreted in the event's timeZone, keep them as is
+        if parsed.tzinfo is not None:
+            value["dateTime"] = parsed.astimezone(tz.UTC).isoformat()
+    return value
+
+
+def event_content_id(calendar_id: str, request_body: Dict[str, Any]) -> str:
+    """
+    Derives a stable Google Calendar event id from the event's content.
+
+    The same event always maps to the same id, so repeating an insert makes
+    the API answer 409 instead of creating a duplicate. Hex digits are a
+    subset of the base32hex alphabet the Calendar API accepts for ids.
+
+    Parameters:
+    - calendar_id (str): The ID of the calendar the event is written to.
+    - request_body (dict): The event body, without an id.
+
+    Returns:
+    - str: A 64 character event id.
+    """
+    body = dict(request_body)
+    body.pop("id", None)
+    body.pop("conferenceData", None)
+    for key in ("start", "end"):
+        if key in body:
+            body[key] = _normalize_time(body[key])
+    body["attendees"] = sorted(
+        attendee["email"].lower() for attendee in body.get("attendees", [])
+    )
+    body["create_google_meet"] = "conferenceData" in request_body
+    payload = json.dumps([calendar_id, body], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
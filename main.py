@@ -10,6 +10,7 @@ from calendar_tools import (
     list_calendar_events,
     create_calendar_list,
 )
+from prefetch import start_prefetch
 from vectorstore import (
     create_store,
     upsert_message,
@@ -57,6 +58,9 @@ def cli():
 )
 def schedule(interactive, session_id, new_chat):
     """Start scheduling meetings and managing your calendar."""
+    # Warm accounts, calendars and events while the user is still typing
+    start_prefetch()
+
     # Handle session management
     if new_chat or not session_id:
         session_id = get_new_session_id()
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from rate_limiter import rate_limiter
+
+
+def iter_paginated(
+    account_id: str,
+    build_request: Callable[[Optional[str]], Any],
+    max_items: Optional[int] = None,
+    prefetch: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the items of a paginated Google API list call.
+
+    While the items of one page are being consumed, the next page is already
+    being fetched in the background, unless the items fetched so far already
+    reach max_items. Closing the generator early stops paging.
+
+    Parameters:
+    - account_id (str): The ID of the account the requests are made for.
+    - build_request (callable): Builds the list request for a page token
+      (None for the first page).
+    - max_items (int): Optional number of items the consumer needs at most.
+    - prefetch (bool): Whether to fetch the next page in the background. Turn
+      it off for consumers that usually stop early at an unknown point.
+
+    Yields:
+    - dict: The items of each page, in order.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    fetched = 0
+    try:
+        page = rate_limiter.execute(account_id, build_request(None))
+        while True:
+            items = page.get("items", [])
+            fetched += len(items)
+            next_page_token = page.get("nextPageToken")
+            if max_items is not None and fetched >= max_items:
+                yield from items[: len(items) - (fetched - max_items)]
+                return
+
+            next_page = None
+            if next_page_token and prefetch:
+                next_page = executor.submit(
+                    rate_limiter.execute, account_id, build_request(next_page_token)
+                )
+
+            yield from items
+
+            if not next_page_token:
+                return
+            if next_page is None:
+                page = rate_limiter.execute(account_id, build_request(next_page_token))
+            else:
+                page = next_page.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,64 @@
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from account_manager import account_manager
+from calendar_tools import (
+    construct_google_calendar_client,
+    fetch_master_events,
+    resolve_working_calendar,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def prefetch_account(account_id: str):
+    """Resolve an account's working calendar and cache this week's events"""
+    # One quiet service for every call, printing would interleave with the prompt
+    calendar_service = construct_google_calendar_client(account_id, quiet=True)
+    calendar_id = resolve_working_calendar(account_id, calendar_service)
+    if calendar_id:
+        today = (
+            datetime.datetime.now()
+            .astimezone()
+            .replace(hour=0, minute=0, second=0, microsecond=0)
+        )
+        week_start = today - datetime.timedelta(days=today.weekday())
+        fetch_master_events(
+            account_id,
+            calendar_id,
+            week_start,
+            week_start + datetime.timedelta(days=7),
+            calendar_service,
+        )
+
+
+def prefetch_session_data():
+    """
+    Warms the caches the calendar agent's first tool calls hit.
+
+    Loads the accounts saved in token_files, then for every account resolves
+    the working calendar (which also lands in the agent's session context)
+    and fetches this week's events, so they can be served from cache.
+    Failures are logged at debug level, keeping them off the user's prompt.
+    """
+    accounts = account_manager.load_saved_accounts(quiet=True)
+    with ThreadPoolExecutor(max_workers=max(1, len(accounts))) as executor:
+        futures = {
+            account_id: executor.submit(prefetch_account, account_id)
+            for account_id in accounts
+        }
+        for account_id, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                # Best effort only, the agent fetches whatever is missing itself
+                logger.debug("Prefetch failed for account %s", account_id, exc_info=e)
+
+
+def start_prefetch() -> threading.Thread:
+    """Run prefetch_session_data in the background while the user types"""
+    thread = threading.Thread(target=prefetch_session_data, daemon=True)
+    thread.start()
+    return thread
@@ -1,5 +1,8 @@
 import textwrap
 import datetime
+from typing import Dict, List
+
+WORKING_CALENDAR_NAME = "Calendar Agent"
 
 main_agent_system_prompt = textwrap.dedent(
     """
@@ -45,13 +48,11 @@ Remember: The calendar agent has all the necessary tools and permissions to hand
 """
 )
 
-current_date = datetime.datetime.now().isoformat()
-
 calendar_agent_system_prompt = textwrap.dedent(
-    f"""
+    """
 You are a helpful agent equipped with various Google Calendar functions to manage multiple calendar accounts.
 
-The current date is {current_date}
+The SESSION CONTEXT at the end of these instructions holds the current date, the local timezone, and the accounts and calendar ids already resolved in this session. Use it instead of looking those up again.
 
 FIRST-TIME SETUP:
 1. When a user first interacts with you:
@@ -92,45 +93,72 @@ CALENDAR OPERATIONS:
 1. Use list_calendar_list(account_id, max_capacity) to retrieve calendars for a specific account
    - Example: list_calendar_list(account_id='work', max_capacity=50)
 
-2. Use list_calendar_events(account_id, calendar_id, max_capacity) to retrieve events
+2. Use list_calendar_events(account_id, calendar_id, max_capacity) to retrieve the upcoming events without a time period
+   - When the user asks what is on their calendar for a period (e.g. today or this week), use list_calendar_events_in_window instead
+   - Take the calendar_id from the SESSION CONTEXT when it is there, otherwise look it up with list_calendar_list
    - Example:
      calendar_list = list_calendar_list(account_id='work', max_capacity=50)
      search for 'Calendar Agent' in calendar_list
      list_calendar_events(account_id='work', calendar_id='calendar_id', max_capacity=20)
 
-3. Before adding any new event:
-   - First check for scheduling conflicts by listing all events during the proposed time period
+3. Use list_calendar_events_in_window(account_id, calendar_id, time_min, time_max, max_capacity) to retrieve the events in a time period
+   - Recurring events are expanded into their exact occurrences within the period
+   - Prefer it over list_calendar_events when checking for conflicts or free slots
+   - Example:
+     list_calendar_events_in_window(
+         account_id='work',
+         calendar_id='calendar_id',
+         time_min='2015-05-28T00:00:00-07:00',
+         time_max='2015-05-29T00:00:00-07:00',
+         max_capacity=50
+     )
+
+4. Use get_time_spent_stats(account_id, calendar_id, time_min, time_max) and get_busiest_days_stats(account_id, calendar_id, time_min, time_max, top_n) for questions about totals or patterns over a period
+   - For example "how many hours of meetings did I have last quarter" or "which days am I busiest"
+   - Do not page through events with list_calendar_events to answer these
+   - Example:
+     get_time_spent_stats(
+         account_id='work',
+         calendar_id='calendar_id',
+         time_min='2015-01-01T00:00:00-07:00',
+         time_max='2015-04-01T00:00:00-07:00'
+     )
+
+5. Before adding any new event:
+   - First check for scheduling conflicts by listing all events during the proposed time period with list_calendar_events_in_window
    - If conflicts are found, inform the user about the conflicts and ask for confirmation to proceed
    - Only proceed with event creation after receiving explicit confirmation from the user
    - If no conflicts are found, proceed with event creation
 
-4. Use insert_calendar_event to add events to a specific account's calendar
+6. Use insert_calendar_event to add events to a specific account's calendar
    - Example:
-     event_details = {{
+     event_details = {
          'summary': 'Meeting with Ted',
          'location': '123 Main St, Anytown, Nigeria',
          'description': 'Discuss project updates.',
-         'start': {{
+         'start': {
              'dateTime': '2015-05-28T09:00:00-07:00',
              'timeZone': 'Africa/Lagos',
-         }},
-         'end': {{
+         },
+         'end': {
              'dateTime': '2015-05-28T17:00:00-07:00',
              'timeZone': 'Africa/Lagos',
-         }},
+         },
          'attendees': [
-             {{'email': 'lpage@example.com'}},
-             {{'email': 'sbrin@example.com'}},
+             {'email': 'lpage@example.com'},
+             {'email': 'sbrin@example.com'},
          ],
          'create_google_meet': True
-     }}
+     }
 
      # First check for conflicts
      calendar_list = list_calendar_list(account_id='work', max_capacity=50)
      search for 'Calendar Agent' in calendar_list
-     existing_events = list_calendar_events(
+     existing_events = list_calendar_events_in_window(
          account_id='work',
          calendar_id='calendar_id',
+         time_min=event_details['start']['dateTime'],
+         time_max=event_details['end']['dateTime'],
          max_capacity=20
      )
      
@@ -157,3 +185,31 @@ CALENDAR OPERATIONS:
 Note: Ensure that boolean values are capitalized (e.g., True instead of true).
 """
 )
+
+
+def build_calendar_agent_context(
+    accounts: List[str], working_calendars: Dict[str, str]
+) -> str:
+    """
+    Builds the per-run suffix of the calendar agent prompt.
+
+    Everything that changes between runs lives here, after the static
+    calendar_agent_system_prompt, so the provider can keep caching the prefix.
+    The instructions are rebuilt on every model turn, so the time is truncated
+    to the minute to keep the whole prompt stable within a tool loop.
+    """
+    now = datetime.datetime.now().astimezone().replace(second=0, microsecond=0)
+    lines = [
+        "",
+        "SESSION CONTEXT:",
+        f"- The current date is {now.isoformat()} ({now.strftime('%A')})",
+        f"- The local timezone is {now.tzname()} (UTC{now.strftime('%z')})",
+    ]
+    if accounts:
+        lines.append(f"- Available accounts: {', '.join(accounts)}")
+    for account_id, calendar_id in working_calendars.items():
+        lines.append(
+            f"- The '{WORKING_CALENDAR_NAME}' calendar for account '{account_id}' "
+            f"has calendar_id '{calendar_id}'"
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,176 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# Google Calendar allows roughly 10 queries per second per user by default.
+DEFAULT_RATE = 5.0
+MAX_RATE = 10.0
+MIN_RATE = 0.5
+BURST_SIZE = 10
+
+SERVER_ERROR_STATUS_CODES = {500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        capacity: int = BURST_SIZE,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a token is available and return the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        """Additively raise the rate back towards the quota ceiling"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttle(self):
+        """Halve the rate and drain the bucket after a quota error"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            self.updated_at = time.monotonic()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 32.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def execute(self, account_id: str, request) -> Any:
+        """Execute a Google API request, throttled and retried per account"""
+        bucket = self._get_bucket(account_id)
+
+        for attempt in range(self.max_retries + 1):
+            waited = bucket.acquire()
+            self._record(account_id, "requests", 1)
+            self._record(account_id, "throttled_seconds", waited)
+
+            try:
+                response = request.execute()
+            except HttpError as error:
+                rate_limited = self._is_rate_limited(error)
+                retryable = (
+                    rate_limited or error.resp.status in SERVER_ERROR_STATUS_CODES
+                )
+                if not retryable or attempt == self.max_retries:
+                    self._record(account_id, "failures", 1)
+                    logger.debug(
+                        "Request failed for %s: %s",
+                        account_id,
+                        self.get_metrics(account_id),
+                    )
+                    raise
+
+                # Server errors say nothing about quota, only slow down for these
+                if rate_limited:
+                    bucket.on_throttle()
+                self._record(account_id, "retries", 1)
+                delay = self._backoff_delay(attempt, error)
+                self._record(account_id, "backoff_seconds", delay)
+                time.sleep(delay)
+                continue
+
+            bucket.on_success()
+            self._record(account_id, "successes", 1)
+            logger.debug(
+                "Request succeeded for %s: %s", account_id, self.get_metrics(account_id)
+            )
+            return response
+
+    def get_metrics(self, account_id: Optional[str] = None) -> Dict[str, Any]:
+        """Return request metrics for one account or for all accounts"""
+        with self.lock:
+            if account_id is not None:
+                metrics = dict(self.metrics.get(account_id, {}))
+                bucket = self.buckets.get(account_id)
+                if bucket:
+                    metrics["current_rate"] = bucket.rate
+                return metrics
+
+            return {
+                account: {**metrics, "current_rate": self.buckets[account].rate}
+                for account, metrics in self.metrics.items()
+            }
+
+    def _get_bucket(self, account_id: str) -> TokenBucket:
+        with self.lock:
+            if account_id not in self.buckets:
+                self.buckets[account_id] = TokenBucket()
+                self.metrics[account_id] = {
+                    "requests": 0,
+                    "successes": 0,
+                    "retries": 0,
+                    "failures": 0,
+                    "throttled_seconds": 0.0,
+                    "backoff_seconds": 0.0,
+                }
+            return self.buckets[account_id]
+
+    def _record(self, account_id: str, key: str, value: float):
+        with self.lock:
+            self.metrics[account_id][key] += value
+
+    def _is_rate_limited(self, error: HttpError) -> bool:
+        status = error.resp.status
+        if status == 429:
+            return True
+        if status == 403:
+            content = error.content
+            if isinstance(content, bytes):
+                content = content.decode("utf-8", errors="ignore")
+            return any(reason in content for reason in RATE_LIMIT_REASONS)
+        return False
+
+    def _backoff_delay(self, attempt: int, error: HttpError) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After if sent"""
+        retry_after = error.resp.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            return min(self.max_delay, float(retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+# Global instance
+rate_limiter = RateLimiter()
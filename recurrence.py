@@ -0,0 +1,231 @@
+import datetime
+import heapq
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dateutil import tz
+from dateutil.parser import isoparse
+from dateutil.rrule import rrulestr
+
+CACHE_TTL_SECONDS = 300
+
+
+def parse_window_time(value: str) -> datetime.datetime:
+    """Parse an ISO timestamp, treating naive values as local time"""
+    parsed = isoparse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz.tzlocal())
+    return parsed
+
+
+def event_start(start: Dict[str, str]) -> datetime.datetime:
+    """Return the aware start of an event, using local midnight for all-day events"""
+    if "date" in start:
+        day = datetime.date.fromisoformat(start["date"])
+        return datetime.datetime.combine(day, datetime.time(), tzinfo=tz.tzlocal())
+    return isoparse(start["dateTime"])
+
+
+def _start_key(start: Dict[str, str]) -> Any:
+    """Key identifying an instance by its original start"""
+    if "date" in start:
+        return start["date"]
+    return isoparse(start["dateTime"]).astimezone(tz.UTC)
+
+
+def _overlaps(
+    event: Dict[str, Any],
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+) -> bool:
+    return (
+        event_start(event["start"]) < window_end
+        and event_start(event["end"]) > window_start
+    )
+
+
+def _sort_key(event: Dict[str, Any]) -> datetime.datetime:
+    return event_start(event["start"])
+
+
+def expand_recurring_event(
+    master: Dict[str, Any],
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+    overrides: Optional[Dict[Any, Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the instances of a recurring event that overlap a window.
+
+    Parameters:
+    - master (dict): The recurring event as returned with singleEvents=False.
+    - window_start (datetime): Aware start of the window.
+    - window_end (datetime): Aware end of the window.
+    - overrides (dict): Modified or cancelled instances keyed by original start.
+      These are skipped here and reported as standalone events instead.
+
+    Yields:
+    - dict: Event instances in start order, shaped like singleEvents=True results.
+    """
+    overrides = overrides or {}
+    start, end = master["start"], master["end"]
+    all_day = "date" in start
+
+    if all_day:
+        dtstart = datetime.datetime.fromisoformat(start["date"])
+        duration = datetime.date.fromisoformat(end["date"]) - dtstart.date()
+        lower = window_start.astimezone(tz.tzlocal()).replace(tzinfo=None)
+        upper = window_end.astimezone(tz.tzlocal()).replace(tzinfo=None)
+    else:
+        zone = tz.gettz(start.get("timeZone")) if start.get("timeZone") else None
+        first_start = isoparse(start["dateTime"])
+        dtstart = first_start.astimezone(zone) if zone else first_start
+        duration = isoparse(end["dateTime"]) - first_start
+        lower, upper = window_start, window_end
+
+    rules = rrulestr("\n".join(master["recurrence"]), dtstart=dtstart, forceset=True)
+
+    for occurrence in rules.xafter(lower - duration, inc=False):
+        if occurrence >= upper:
+            break
+
+        if all_day:
+            original = {"date": occurrence.date().isoformat()}
+            instance_start = original
+            instance_end = {"date": (occurrence + duration).date().isoformat()}
+            suffix = occurrence.strftime("%Y%m%d")
+        else:
+            original = {"dateTime": occurrence.isoformat()}
+            if start.get("timeZone"):
+                original["timeZone"] = start["timeZone"]
+            instance_start = original
+            instance_end = {"dateTime": (occurrence + duration).isoformat()}
+            if end.get("timeZone"):
+                instance_end["timeZone"] = end["timeZone"]
+            suffix = occurrence.astimezone(tz.UTC).strftime("%Y%m%dT%H%M%SZ")
+
+        if _start_key(original) in overrides:
+            continue
+
+        instance = {k: v for k, v in master.items() if k != "recurrence"}
+        instance.update(
+            {
+                "id": f"{master['id']}_{suffix}",
+                "recurringEventId": master["id"],
+                "originalStartTime": original,
+                "start": instance_start,
+                "end": instance_end,
+            }
+        )
+        yield instance
+
+
+def iter_event_instances(
+    events: List[Dict[str, Any]],
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields every event instance overlapping a window, in start order.
+
+    Parameters:
+    - events (list): Events fetched with singleEvents=False, i.e. single events,
+      recurring masters and their modified or cancelled instances.
+    - window_start (datetime): Aware start of the window.
+    - window_end (datetime): Aware end of the window.
+
+    Yields:
+    - dict: Event instances, with recurring events expanded client-side.
+    """
+    masters = []
+    singles = []
+    overrides: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+
+    for event in events:
+        if event.get("recurrence"):
+            if event.get("status") != "cancelled":
+                masters.append(event)
+        elif event.get("recurringEventId"):
+            original = event.get("originalStartTime", event.get("start"))
+            overrides.setdefault(event["recurringEventId"], {})[
+                _start_key(original)
+            ] = event
+            if event.get("status") != "cancelled" and _overlaps(
+                event, window_start, window_end
+            ):
+                singles.append(event)
+        elif event.get("status") != "cancelled" and _overlaps(
+            event, window_start, window_end
+        ):
+            singles.append(event)
+
+    streams = [sorted(singles, key=_sort_key)]
+    for master in masters:
+        streams.append(
+            expand_recurring_event(
+                master, window_start, window_end, overrides.get(master["id"])
+            )
+        )
+    return heapq.merge(*streams, key=_sort_key)
+
+
+class RecurrenceCache:
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.entries: Dict[
+            Tuple[str, str],
+            Tuple[float, datetime.datetime, datetime.datetime, List[Dict[str, Any]]],
+        ] = {}
+        self.lock = threading.Lock()
+        self.fetch_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def get(
+        self,
+        account_id: str,
+        calendar_id: str,
+        window_start: datetime.datetime,
+        window_end: datetime.datetime,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Get the cached events for a calendar if they are fresh and cover the window"""
+        with self.lock:
+            entry = self.entries.get((account_id, calendar_id))
+            if not entry or time.monotonic() - entry[0] >= self.ttl:
+                return None
+            if entry[1] <= window_start and window_end <= entry[2]:
+                return entry[3]
+            return None
+
+    def set(
+        self,
+        account_id: str,
+        calendar_id: str,
+        window_start: datetime.datetime,
+        window_end: datetime.datetime,
+        events: List[Dict[str, Any]],
+    ):
+        """Store the events fetched for a calendar over a window"""
+        with self.lock:
+            self.entries[(account_id, calendar_id)] = (
+                time.monotonic(),
+                window_start,
+                window_end,
+                events,
+            )
+
+    def fetch_lock(self, account_id: str, calendar_id: str) -> threading.Lock:
+        """Get the lock held while a calendar's events are being fetched"""
+        with self.lock:
+            key = (account_id, calendar_id)
+            if key not in self.fetch_locks:
+                self.fetch_locks[key] = threading.Lock()
+            return self.fetch_locks[key]
+
+    def invalidate(self, account_id: str, calendar_id: str):
+        """Drop the cached events for a calendar after it has been modified"""
+        with self.lock:
+            self.entries.pop((account_id, calendar_id), None)
+
+
+# Global instance
+recurrence_cache = RecurrenceCache()
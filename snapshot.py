@@ -0,0 +1,275 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from file_utils import atomic_write, locked_file
+from recurrence import event_start
+
+SNAPSHOT_TTL_SECONDS = 3600
+COLUMNS = ("start", "end", "duration", "attendees", "summary", "all_day")
+
+
+class CalendarSnapshot:
+    def __init__(self, meta: Dict[str, Any], columns: Dict[str, np.ndarray]):
+        self.window_start: float = meta["window_start"]
+        self.window_end: float = meta["window_end"]
+        self.built_at: float = meta["built_at"]
+        self.summaries: List[str] = meta["summaries"]
+        self.start = columns["start"]
+        self.end = columns["end"]
+        self.duration = columns["duration"]
+        self.attendees = columns["attendees"]
+        self.summary = columns["summary"]
+        self.all_day = columns["all_day"]
+
+    def covers(self, window_start: float, window_end: float) -> bool:
+        """Whether the snapshot holds every event overlapping the window"""
+        return self.window_start <= window_start and window_end <= self.window_end
+
+    def timed_events_in(self, window_start: float, window_end: float) -> np.ndarray:
+        """Boolean mask of the timed events overlapping the window"""
+        return (self.start < window_end) & (self.end > window_start) & ~self.all_day
+
+
+def build_columns(instances: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Converts event instances into columnar arrays.
+
+    Parameters:
+    - instances (iterable): Expanded event instances, e.g. from
+      iter_event_instances.
+
+    Returns:
+    - dict: NumPy arrays keyed by column name, plus the interned summary
+      table under "summaries".
+    """
+    starts, ends, attendees, summary_ids, all_day = [], [], [], [], []
+    summaries: List[str] = []
+    summary_index: Dict[str, int] = {}
+
+    for instance in instances:
+        summary = instance.get("summary", "")
+        if summary not in summary_index:
+            summary_index[summary] = len(summaries)
+            summaries.append(summary)
+
+        starts.append(event_start(instance["start"]).timestamp())
+        ends.append(event_start(instance["end"]).timestamp())
+        attendees.append(len(instance.get("attendees", [])))
+        summary_ids.append(summary_index[summary])
+        all_day.append("date" in instance["start"])
+
+    start = np.array(starts, dtype=np.int64)
+    end = np.array(ends, dtype=np.int64)
+    return {
+        "start": start,
+        "end": end,
+        "duration": end - start,
+        "attendees": np.array(attendees, dtype=np.int32),
+        "summary": np.array(summary_ids, dtype=np.int32),
+        "all_day": np.array(all_day, dtype=bool),
+        "summaries": summaries,
+    }
+
+
+class SnapshotStore:
+    def __init__(
+        self, snapshot_dir: str = "snapshot_files", ttl: float = SNAPSHOT_TTL_SECONDS
+    ):
+        self.snapshot_dir = snapshot_dir
+        self.ttl = ttl
+
+        # Ensure snapshot directory exists
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def load(self, account_id: str, calendar_id: str) -> Optional[CalendarSnapshot]:
+        """Memory-map a calendar's snapshot from disk if it is still fresh"""
+        path = self._snapshot_path(account_id, calendar_id)
+        meta_file = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_file):
+            return None
+
+        try:
+            # Locked so a writer in another process can't remove these files
+            # between reading meta.json and mapping the columns
+            with locked_file(path):
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                if time.time() - meta["built_at"] >= self.ttl:
+                    return None
+
+                columns = {
+                    column: np.load(
+                        os.path.join(path, f"{meta['version']}_{column}.npy"),
+                        mmap_mode="r",
+                    )
+                    for column in COLUMNS
+                }
+            return CalendarSnapshot(meta, columns)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading snapshot: {e}")
+            return None
+
+    def save(
+        self,
+        account_id: str,
+        calendar_id: str,
+        instances: Iterable[Dict[str, Any]],
+        window_start: datetime.datetime,
+        window_end: datetime.datetime,
+    ) -> CalendarSnapshot:
+        """Write a calendar's snapshot to disk and return it"""
+        columns = build_columns(instances)
+        path = self._snapshot_path(account_id, calendar_id)
+        version = f"{time.time_ns()}_{os.getpid()}_{threading.get_ident()}"
+        meta = {
+            "version": version,
+            "window_start": window_start.timestamp(),
+            "window_end": window_end.timestamp(),
+            "built_at": time.time(),
+            "summaries": columns["summaries"],
+        }
+
+        # Columns are written under a fresh version and published by the
+        # atomic meta.json swap. The file lock keeps other threads and
+        # processes from cleaning up a version that is still being written.
+        with locked_file(path):
+            os.makedirs(path, exist_ok=True)
+            for column in COLUMNS:
+                np.save(os.path.join(path, f"{version}_{column}.npy"), columns[column])
+            atomic_write(os.path.join(path, "meta.json"), json.dumps(meta))
+            self._remove_old_versions(path, version)
+
+        return CalendarSnapshot(meta, columns)
+
+    def invalidate(self, account_id: str, calendar_id: str):
+        """Drop a calendar's snapshot after it has been modified"""
+        path = self._snapshot_path(account_id, calendar_id)
+        with locked_file(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _snapshot_path(self, account_id: str, calendar_id: str) -> str:
+        key = hashlib.sha1(f"{account_id}:{calendar_id}".encode("utf-8")).hexdigest()
+        return os.path.join(self.snapshot_dir, key)
+
+    def _remove_old_versions(self, path: str, version: str):
+        for name in os.listdir(path):
+            if name.endswith(".npy") and not name.startswith(f"{version}_"):
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError:
+                    # Still mapped by a reader on Windows, removed next time
+                    pass
+
+
+def _clip_to_window(
+    snapshot: CalendarSnapshot, mask: np.ndarray, window_start: float, window_end: float
+):
+    """Starts and ends of the masked events, clipped to the window"""
+    return (
+        np.maximum(snapshot.start[mask], window_start),
+        np.minimum(snapshot.end[mask], window_end),
+    )
+
+
+def time_spent_stats(
+    snapshot: CalendarSnapshot, window_start: float, window_end: float, top_n: int = 5
+) -> Dict[str, Any]:
+    """
+    Summarizes the time spent in timed events overlapping a window.
+
+    Events are clipped to the window, all-day events are ignored.
+    """
+    mask = snapshot.timed_events_in(window_start, window_end)
+    clipped_start, clipped_end = _clip_to_window(
+        snapshot, mask, window_start, window_end
+    )
+    clipped = clipped_end - clipped_start
+    summary_ids = snapshot.summary[mask]
+
+    total_seconds = int(clipped.sum())
+    count = int(mask.sum())
+    per_summary = np.bincount(
+        summary_ids, weights=clipped, minlength=len(snapshot.summaries)
+    )
+    top = np.argsort(per_summary)[::-1][:top_n]
+
+    return {
+        "event_count": count,
+        "total_hours": round(total_seconds / 3600, 2),
+        "average_minutes": round(total_seconds / 60 / count, 1) if count else 0.0,
+        "events_with_attendees": int((snapshot.attendees[mask] > 0).sum()),
+        "top_events": [
+            {
+                "summary": snapshot.summaries[i],
+                "hours": round(float(per_summary[i]) / 3600, 2),
+            }
+            for i in top
+            if per_summary[i] > 0
+        ],
+    }
+
+
+def busiest_days_stats(
+    snapshot: CalendarSnapshot,
+    window_start: float,
+    window_end: float,
+    utc_offset: float,
+    top_n: int = 5,
+) -> Dict[str, Any]:
+    """
+    Ranks the days in a window by hours spent in timed events.
+
+    Events are clipped to the window like in time_spent_stats and bucketed by
+    their local start day, using utc_offset in seconds.
+    """
+    mask = snapshot.timed_events_in(window_start, window_end)
+    clipped_start, clipped_end = _clip_to_window(
+        snapshot, mask, window_start, window_end
+    )
+    first_day = int((window_start + utc_offset) // 86400)
+    days = ((clipped_start + utc_offset) // 86400 - first_day).astype(np.int64)
+
+    hours = np.bincount(days, weights=clipped_end - clipped_start) / 3600
+    counts = np.bincount(days)
+    weekday_hours = np.zeros(7)
+    # 1970-01-01 was a Thursday, i.e. weekday 3
+    np.add.at(weekday_hours, (np.arange(len(hours)) + first_day + 3) % 7, hours)
+
+    top = np.argsort(hours)[::-1][:top_n]
+    weekdays = [
+        "Monday",
+        "Tuesday",
+        "Wednesday",
+        "Thursday",
+        "Friday",
+        "Saturday",
+        "Sunday",
+    ]
+    return {
+        "busiest_days": [
+            {
+                "date": datetime.date.fromordinal(
+                    datetime.date(1970, 1, 1).toordinal() + first_day + int(i)
+                ).isoformat(),
+                "hours": round(float(hours[i]), 2),
+                "event_count": int(counts[i]),
+            }
+            for i in top
+            if hours[i] > 0
+        ],
+        "hours_by_weekday": {
+            weekdays[i]: round(float(weekday_hours[i]), 2) for i in range(7)
+        },
+    }
+
+
+# Global instance
+snapshot_store = SnapshotStore()